@@ -25,7 +25,7 @@ CREATE TABLE IF NOT EXISTS responses (
     subreddit TEXT NOT NULL,
     response_text TEXT NOT NULL,
     generated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    posted_at TIMESTAMP,
+    posted_at INTEGER,  -- Unix epoch seconds
     status TEXT NOT NULL DEFAULT 'pending',
     comment_id TEXT,
     error_message TEXT,
@@ -37,8 +37,8 @@ CREATE TABLE IF NOT EXISTS responses (
 CREATE TABLE IF NOT EXISTS subreddit_cooldowns (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     subreddit TEXT UNIQUE NOT NULL,
-    last_post_at TIMESTAMP NOT NULL,
-    cooldown_until TIMESTAMP NOT NULL
+    last_post_at INTEGER NOT NULL,  -- Unix epoch seconds
+    cooldown_until INTEGER NOT NULL  -- Unix epoch seconds
 );
 
 -- Table: gemini_queries
@@ -59,3 +59,5 @@ CREATE INDEX IF NOT EXISTS idx_threads_subreddit ON threads(subreddit);
 CREATE INDEX IF NOT EXISTS idx_responses_status ON responses(status);
 CREATE INDEX IF NOT EXISTS idx_subreddit_cooldowns_subreddit ON subreddit_cooldowns(subreddit);
 CREATE INDEX IF NOT EXISTS idx_responses_posted_at ON responses(posted_at);
+CREATE INDEX IF NOT EXISTS idx_responses_rid_status ON responses(reddit_thread_id, status);
+CREATE INDEX IF NOT EXISTS idx_cooldowns_until ON subreddit_cooldowns(cooldown_until);
\ No newline at end of file
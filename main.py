@@ -7,8 +7,10 @@ LM Studio, and posts comments while tracking engagement to prevent spam.
 
 import os
 import sys
-import time
 import signal
+import threading
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from dotenv import load_dotenv
 
@@ -27,15 +29,14 @@ logger = setup_logger(
     log_file=os.getenv('LOG_FILE', './logs/reddit_bot.log')
 )
 
-# Global flag for graceful shutdown
-running = True
+# Set on shutdown; the main loop waits on it between cycles
+shutdown_event = threading.Event()
 
 
 def signal_handler(signum, frame):
     """Handle shutdown signals gracefully"""
-    global running
     logger.info("Shutdown signal received. Finishing current cycle...")
-    running = False
+    shutdown_event.set()
 
 
 def validate_environment():
@@ -77,9 +78,14 @@ def initialize_clients():
         db = Database(db_path)
         
         # Initialize Gemini client
+        # Cycles start one check interval apart, so a 1.5-interval TTL reuses
+        # each discovery result for exactly one following cycle
         gemini = GeminiClient(
             cli_path=os.getenv('GEMINI_CLI_PATH', 'gemini'),
-            prompt_file='./prompts/gemini_discovery.txt'
+            prompt_file='./prompts/gemini_discovery.txt',
+            cache_ttl=int(os.getenv('CHECK_INTERVAL_MINUTES', '10')) * 90,
+            api_key=os.getenv('GEMINI_API_KEY'),
+            model_name=os.getenv('GEMINI_MODEL', 'gemini-1.5-flash')
         )
         
         # Initialize Reddit client
@@ -97,7 +103,8 @@ def initialize_clients():
             model=os.getenv('LM_STUDIO_MODEL', 'meta-llama-3.1-8b-instruct'),
             temperature=float(os.getenv('LM_STUDIO_TEMPERATURE', '0.7')),
             max_tokens=int(os.getenv('LM_STUDIO_MAX_TOKENS', '-1')),
-            prompt_file='./prompts/response_generation.txt'
+            prompt_file='./prompts/response_generation.txt',
+            cache_path=os.getenv('LM_STUDIO_CACHE_PATH', './cache/llm_responses.db') or None
         )
         
         return db, gemini, reddit, lm_studio
@@ -140,42 +147,31 @@ def test_connections(gemini, reddit, lm_studio):
     return True
 
 
-def process_thread(db, reddit, lm_studio, thread_info, subreddit_cooldown_days, thread_cooldown_days):
+def precheck_thread(reddit, thread_info, submission, responded_ids):
     """
-    Process a single thread: search, generate response, and post.
+    Run all read-only eligibility checks for a Gemini candidate found on Reddit.
+    
+    Subreddit cooldowns are expected to be filtered out by the caller before
+    any Reddit API work is done.
     
     Args:
-        db: Database instance
         reddit: RedditClient instance
-        lm_studio: LMStudioClient instance
         thread_info: Thread information from Gemini
-        subreddit_cooldown_days: Subreddit cooldown period
-        thread_cooldown_days: Thread cooldown period (usually very large)
+        submission: Matching Reddit submission (None if it couldn't be found)
+        responded_ids: Set of Reddit thread IDs we've already posted to
     
     Returns:
-        True if successfully posted, False otherwise
+        Candidate dict (submission, thread_details, subreddit) if eligible
+        for a response, None otherwise
     """
     subreddit = thread_info.get('subreddit')
     title = thread_info.get('title')
-    keywords = thread_info.get('keywords', [])
     
-    logger.info(f"Processing thread: {title[:50]}... in r/{subreddit}")
-    
-    # Check subreddit cooldown
-    if db.is_subreddit_on_cooldown(subreddit, subreddit_cooldown_days):
-        logger.info(f"r/{subreddit} is on cooldown - skipping")
-        return False
-    
-    # Search for thread on Reddit
-    submission = reddit.search_thread_by_exact_title(subreddit, title)
-    
-    if not submission:
-        # Try keyword search as fallback
-        submission = reddit.search_thread(subreddit, [title] + keywords)
+    logger.info(f"Checking thread: {title[:50]}... in r/{subreddit}")
     
     if not submission:
         logger.warning(f"Could not find thread on Reddit: {title[:50]}...")
-        return False
+        return None
     
     # Get thread details
     thread_details = reddit.get_thread_details(submission)
@@ -184,41 +180,77 @@ def process_thread(db, reddit, lm_studio, thread_info, subreddit_cooldown_days,
     # Check if thread is locked or archived
     if reddit.is_thread_archived(submission):
         logger.info(f"Thread {reddit_thread_id} is archived - skipping")
-        return False
+        return None
     
     if reddit.is_thread_locked(submission):
         logger.info(f"Thread {reddit_thread_id} is locked - skipping")
-        return False
+        return None
     
     # Check if we've already responded to this thread
-    if db.has_responded_to_thread(reddit_thread_id):
+    if reddit_thread_id in responded_ids:
         logger.info(f"Already responded to thread {reddit_thread_id} - skipping")
-        return False
+        return None
     
-    # Add thread to database if not exists
-    thread_id = db.add_thread(
-        reddit_thread_id=reddit_thread_id,
-        subreddit=thread_details['subreddit'],
-        title=thread_details['title'],
-        url=thread_details['url'],
-        created_utc=thread_details['created_utc'],
-        author=thread_details['author'],
-        score=thread_details['score'],
-        num_comments=thread_details['num_comments']
-    )
+    # Reddit's own spelling, so cooldowns are stored under one canonical name
+    return {
+        'subreddit': thread_details['subreddit'],
+        'submission': submission,
+        'thread_details': thread_details
+    }
+
+
+async def precheck_threads_async(reddit, threads, responded_ids):
+    """
+    Look up all candidates on Reddit concurrently, then run precheck_thread on each.
+    
+    Args:
+        reddit: RedditClient instance
+        threads: Thread information list from Gemini
+        responded_ids: Set of Reddit thread IDs we've already posted to
     
-    if thread_id is None:
-        # Thread already exists, get the ID
-        existing_thread = db.get_thread_by_reddit_id(reddit_thread_id)
-        thread_id = existing_thread['id']
+    Returns:
+        List of eligible candidate dicts, in Gemini's order
+    """
+    submissions = await reddit.search_many([
+        (t.get('subreddit'), t.get('title'), t.get('keywords', []))
+        for t in threads
+    ])
     
-    # Generate response using LM Studio
-    logger.info("Generating response with LM Studio...")
-    response_text = lm_studio.generate_response(
-        subreddit=thread_details['subreddit'],
-        title=thread_details['title'],
-        content=thread_details['selftext']
-    )
+    candidates = []
+    for thread_info, submission in zip(threads, submissions):
+        try:
+            result = precheck_thread(reddit, thread_info, submission, responded_ids)
+        except Exception as e:
+            logger.error(f"Error checking thread {thread_info.get('title', '')[:50]}...: {str(e)}")
+            continue
+        if result is not None:
+            candidates.append(result)
+    
+    return candidates
+
+
+def post_thread(db, reddit, lm_studio, candidate, response_text, subreddit_cooldown_days):
+    """
+    Validate a pre-generated response for a prechecked candidate and post it.
+    
+    Args:
+        db: Database instance
+        reddit: RedditClient instance
+        lm_studio: LMStudioClient instance
+        candidate: Candidate dict returned by precheck_thread, with thread_id set
+        response_text: Response generated by LM Studio (None if generation failed)
+        subreddit_cooldown_days: Subreddit cooldown period
+    
+    Returns:
+        True if successfully posted, False otherwise
+    """
+    subreddit = candidate['subreddit']
+    submission = candidate['submission']
+    thread_details = candidate['thread_details']
+    thread_id = candidate['thread_id']
+    reddit_thread_id = thread_details['reddit_thread_id']
+    
+    logger.info(f"Processing thread: {thread_details['title'][:50]}... in r/{subreddit}")
     
     if not response_text:
         logger.error("Failed to generate response")
@@ -255,6 +287,24 @@ def process_thread(db, reddit, lm_studio, thread_info, subreddit_cooldown_days,
         return False
 
 
+def log_statistics(db):
+    """
+    Log overall statistics.
+    
+    Args:
+        db: Database instance
+    """
+    try:
+        stats = db.get_statistics()
+        logger.info(f"\nOverall Statistics:")
+        logger.info(f"  Total threads discovered: {stats['total_threads']}")
+        logger.info(f"  Posts in last 24h: {stats['posts_last_24h']}")
+        logger.info(f"  Active cooldowns: {stats['active_cooldowns']}")
+        logger.info(f"  Response status breakdown: {stats['responses_by_status']}")
+    except Exception as e:
+        logger.error(f"Error logging statistics: {str(e)}")
+
+
 def main_loop(db, gemini, reddit, lm_studio):
     """
     Main execution loop - runs every CHECK_INTERVAL_MINUTES.
@@ -273,9 +323,12 @@ def main_loop(db, gemini, reddit, lm_studio):
     logger.info(f"Subreddit cooldown: {subreddit_cooldown_days} days")
     logger.info(f"Thread cooldown: {thread_cooldown_days} days")
     
+    stats_interval = max(1, int(os.getenv('STATS_LOG_INTERVAL_CYCLES', '10')))
+    stats_executor = ThreadPoolExecutor(max_workers=1)
+    
     cycle_count = 0
     
-    while running:
+    while not shutdown_event.is_set():
         cycle_count += 1
         cycle_start = datetime.now()
         
@@ -300,14 +353,54 @@ def main_loop(db, gemini, reddit, lm_studio):
             else:
                 logger.info(f"Found {len(threads)} potentially relevant threads")
                 
-                # Process each thread
+                # Drop candidates in cooled-down subreddits before any Reddit API call
+                # (names compared lowercased - Gemini's casing varies between cycles)
+                cooled_subreddits = db.get_cooled_subreddits()
+                threads = [t for t in threads if t['subreddit'].lower() not in cooled_subreddits]
+                logger.info(f"{len(threads)} thread(s) outside subreddit cooldowns")
+                
+                # Check all candidates concurrently, then post serially
+                responded_ids = db.get_responded_thread_ids()
+                candidates = asyncio.run(precheck_threads_async(reddit, threads, responded_ids))
+                
+                # Gemini can name the same thread twice, and a post puts its whole
+                # subreddit on cooldown, so keep one candidate per subreddit
+                seen_subreddits = set()
+                unique_candidates = []
+                for candidate in candidates:
+                    subreddit_key = candidate['subreddit'].lower()
+                    if subreddit_key not in seen_subreddits:
+                        seen_subreddits.add(subreddit_key)
+                        unique_candidates.append(candidate)
+                candidates = unique_candidates
+                logger.info(f"{len(candidates)} thread(s) eligible for a response")
+                
+                # Record all eligible threads in one transaction
+                thread_ids = db.add_threads_bulk([c['thread_details'] for c in candidates])
+                for candidate in candidates:
+                    candidate['thread_id'] = thread_ids[candidate['thread_details']['reddit_thread_id']]
+                
+                # Generate responses for all eligible threads in one batch. Ones not
+                # posted this cycle stay in LM Studio's response cache for the next.
+                responses = []
+                if candidates:
+                    logger.info(f"Generating {len(candidates)} response(s) with LM Studio...")
+                    responses = lm_studio.generate_responses_batch([
+                        {
+                            'subreddit': c['thread_details']['subreddit'],
+                            'title': c['thread_details']['title'],
+                            'content': c['thread_details']['selftext']
+                        }
+                        for c in candidates
+                    ])
+                
                 posts_made = 0
-                for idx, thread_info in enumerate(threads, 1):
-                    logger.info(f"\nProcessing thread {idx}/{len(threads)}")
+                for idx, (candidate, response_text) in enumerate(zip(candidates, responses), 1):
+                    logger.info(f"\nProcessing thread {idx}/{len(candidates)}")
                     
-                    success = process_thread(
-                        db, reddit, lm_studio, thread_info,
-                        subreddit_cooldown_days, thread_cooldown_days
+                    success = post_thread(
+                        db, reddit, lm_studio, candidate, response_text,
+                        subreddit_cooldown_days
                     )
                     
                     if success:
@@ -318,13 +411,9 @@ def main_loop(db, gemini, reddit, lm_studio):
                 
                 logger.info(f"Cycle complete: {posts_made} post(s) made")
             
-            # Print statistics
-            stats = db.get_statistics()
-            logger.info(f"\nOverall Statistics:")
-            logger.info(f"  Total threads discovered: {stats['total_threads']}")
-            logger.info(f"  Posts in last 24h: {stats['posts_last_24h']}")
-            logger.info(f"  Active cooldowns: {stats['active_cooldowns']}")
-            logger.info(f"  Response status breakdown: {stats['responses_by_status']}")
+            # Print statistics every Nth cycle, off the main thread
+            if (cycle_count - 1) % stats_interval == 0:
+                stats_executor.submit(log_statistics, db)
             
         except KeyboardInterrupt:
             logger.info("Keyboard interrupt received")
@@ -336,16 +425,16 @@ def main_loop(db, gemini, reddit, lm_studio):
         cycle_duration = (datetime.now() - cycle_start).total_seconds()
         sleep_time = max(0, check_interval - cycle_duration)
         
-        if running and sleep_time > 0:
+        if not shutdown_event.is_set() and sleep_time > 0:
             next_run = datetime.now().timestamp() + sleep_time
             next_run_str = datetime.fromtimestamp(next_run).strftime('%Y-%m-%d %H:%M:%S')
             logger.info(f"\nSleeping for {sleep_time/60:.1f} minutes until next cycle at {next_run_str}")
             
-            # Sleep in smaller intervals to allow for graceful shutdown
-            for _ in range(int(sleep_time)):
-                if not running:
-                    break
-                time.sleep(1)
+            # Wakes immediately if a shutdown signal arrives
+            if shutdown_event.wait(sleep_time):
+                break
+    
+    stats_executor.shutdown(wait=True)
 
 
 def main():
@@ -383,6 +472,9 @@ def main():
         logger.error(f"Fatal error: {str(e)}", exc_info=True)
         sys.exit(1)
     finally:
+        reddit.close()
+        lm_studio.close()
+        db.close()
         logger.info("Bot shutdown complete")
 
 
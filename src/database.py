@@ -4,12 +4,29 @@ Database operations for Reddit engagement tracking
 
 import sqlite3
 import os
-from datetime import datetime, timedelta
+import threading
+import time
 from contextlib import contextmanager
 import logging
 
 logger = logging.getLogger('RedditBot')
 
+# Hot-path queries kept as constant strings (never interpolated) so every call
+# hits the connection's prepared statement cache
+THREAD_EXISTS_SQL = "SELECT 1 FROM threads WHERE reddit_thread_id = ? LIMIT 1"
+
+HAS_RESPONDED_SQL = """
+    SELECT 1 FROM responses
+    WHERE reddit_thread_id = ? AND status = 'posted'
+    LIMIT 1
+"""
+
+SUBREDDIT_COOLDOWN_SQL = """
+    SELECT 1 FROM subreddit_cooldowns
+    WHERE subreddit = ? COLLATE NOCASE AND cooldown_until > CAST(strftime('%s', 'now') AS INTEGER)
+    LIMIT 1
+"""
+
 
 class Database:
     """Handles all database operations for the Reddit bot"""
@@ -26,24 +43,50 @@ class Database:
         # Create database directory if it doesn't exist
         os.makedirs(os.path.dirname(db_path), exist_ok=True)
         
+        # Single long-lived connection shared by all operations. Autocommit
+        # mode (isolation_level=None) so reads don't open transactions;
+        # writes go through transaction() instead.
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None,
+                                     cached_statements=256)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA temp_store=MEMORY")
+        self._conn.execute("PRAGMA cache_size=-20000")
+        
         # Initialize database schema
         self._initialize_schema()
         logger.info(f"Database initialized at {db_path}")
     
     @contextmanager
     def get_connection(self):
-        """Context manager for database connections"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        try:
-            yield conn
-            conn.commit()
-        except Exception as e:
-            conn.rollback()
-            logger.error(f"Database error: {str(e)}")
-            raise
-        finally:
-            conn.close()
+        """Context manager for read access to the shared connection"""
+        with self._lock:
+            try:
+                yield self._conn
+            except Exception as e:
+                logger.error(f"Database error: {str(e)}")
+                raise
+    
+    @contextmanager
+    def transaction(self):
+        """Context manager for writes - wraps the block in BEGIN IMMEDIATE/COMMIT"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+                self._conn.execute("COMMIT")
+            except Exception as e:
+                self._conn.execute("ROLLBACK")
+                logger.error(f"Database error: {str(e)}")
+                raise
+    
+    def close(self):
+        """Close the shared database connection"""
+        with self._lock:
+            self._conn.close()
+        logger.debug("Database connection closed")
     
     def _initialize_schema(self):
         """Create database tables if they don't exist"""
@@ -56,43 +99,110 @@ class Database:
             with self.get_connection() as conn:
                 conn.executescript(schema_sql)
                 logger.debug("Database schema created/verified")
+            
+            self._migrate_timestamps()
         else:
             logger.warning(f"Schema file not found: {schema_file}")
     
+    def _migrate_timestamps(self):
+        """
+        Convert text timestamps from older databases to Unix epoch integers.
+        
+        SQLite can't change a column's declared type, but TIMESTAMP columns
+        have numeric affinity and store the converted integers natively.
+        Older versions wrote naive local times (datetime.now()), so the
+        'utc' modifier shifts them from local time to UTC before conversion.
+        """
+        with self.transaction() as conn:
+            cursor = conn.execute("""
+                UPDATE responses
+                SET posted_at = CAST(strftime('%s', posted_at, 'utc') AS INTEGER)
+                WHERE typeof(posted_at) = 'text'
+            """)
+            migrated = cursor.rowcount
+            
+            cursor = conn.execute("""
+                UPDATE subreddit_cooldowns
+                SET last_post_at = CASE WHEN typeof(last_post_at) = 'text'
+                        THEN CAST(strftime('%s', last_post_at, 'utc') AS INTEGER)
+                        ELSE last_post_at END,
+                    cooldown_until = CASE WHEN typeof(cooldown_until) = 'text'
+                        THEN CAST(strftime('%s', cooldown_until, 'utc') AS INTEGER)
+                        ELSE cooldown_until END
+                WHERE typeof(last_post_at) = 'text' OR typeof(cooldown_until) = 'text'
+            """)
+            migrated += cursor.rowcount
+        
+        if migrated:
+            logger.info(f"Migrated {migrated} row(s) to epoch timestamps")
+    
     # ==================== THREAD OPERATIONS ====================
     
     def thread_exists(self, reddit_thread_id):
         """Check if thread already exists in database"""
         with self.get_connection() as conn:
-            cursor = conn.execute(
-                "SELECT id FROM threads WHERE reddit_thread_id = ?",
-                (reddit_thread_id,)
-            )
+            cursor = conn.execute(THREAD_EXISTS_SQL, (reddit_thread_id,))
             return cursor.fetchone() is not None
     
     def add_thread(self, reddit_thread_id, subreddit, title, url, created_utc=None, 
                    author=None, score=0, num_comments=0):
         """
-        Add a new thread to the database.
+        Add a thread to the database if it isn't already stored.
         
         Returns:
-            Thread ID if added, None if already exists
+            Thread ID (of the new row, or of the existing one)
         """
-        if self.thread_exists(reddit_thread_id):
-            logger.debug(f"Thread {reddit_thread_id} already exists")
-            return None
-        
-        with self.get_connection() as conn:
-            cursor = conn.execute("""
+        with self.transaction() as conn:
+            row = conn.execute("""
                 INSERT INTO threads (reddit_thread_id, subreddit, title, url, 
                                    created_utc, author, score, num_comments)
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(reddit_thread_id) DO NOTHING
+                RETURNING id
             """, (reddit_thread_id, subreddit, title, url, created_utc, 
-                  author, score, num_comments))
+                  author, score, num_comments)).fetchone()
+            
+            if row is None:
+                logger.debug(f"Thread {reddit_thread_id} already exists")
+                row = conn.execute(
+                    "SELECT id FROM threads WHERE reddit_thread_id = ?",
+                    (reddit_thread_id,)
+                ).fetchone()
+            else:
+                logger.info(f"Added thread {reddit_thread_id} from r/{subreddit}")
+            
+            return row['id']
+    
+    def add_threads_bulk(self, threads):
+        """
+        Add many threads in a single transaction, ignoring ones already stored.
+        
+        Args:
+            threads: List of dicts with the add_thread fields (extra keys are ignored)
+        
+        Returns:
+            Dictionary mapping reddit_thread_id to thread ID for every given thread
+        """
+        if not threads:
+            return {}
+        
+        reddit_thread_ids = [thread['reddit_thread_id'] for thread in threads]
+        
+        with self.transaction() as conn:
+            cursor = conn.executemany("""
+                INSERT OR IGNORE INTO threads (reddit_thread_id, subreddit, title, url, 
+                                             created_utc, author, score, num_comments)
+                VALUES (:reddit_thread_id, :subreddit, :title, :url, 
+                        :created_utc, :author, :score, :num_comments)
+            """, threads)
+            logger.info(f"Added {cursor.rowcount} new thread(s) out of {len(threads)}")
             
-            thread_id = cursor.lastrowid
-            logger.info(f"Added thread {reddit_thread_id} from r/{subreddit}")
-            return thread_id
+            placeholders = ','.join('?' * len(reddit_thread_ids))
+            cursor = conn.execute(
+                f"SELECT id, reddit_thread_id FROM threads WHERE reddit_thread_id IN ({placeholders})",
+                reddit_thread_ids
+            )
+            return {row['reddit_thread_id']: row['id'] for row in cursor.fetchall()}
     
     def get_thread_by_reddit_id(self, reddit_thread_id):
         """Get thread details by Reddit ID"""
@@ -109,12 +219,22 @@ class Database:
     def has_responded_to_thread(self, reddit_thread_id):
         """Check if we've already responded to this thread"""
         with self.get_connection() as conn:
-            cursor = conn.execute("""
-                SELECT id FROM responses 
-                WHERE reddit_thread_id = ? AND status = 'posted'
-            """, (reddit_thread_id,))
+            cursor = conn.execute(HAS_RESPONDED_SQL, (reddit_thread_id,))
             return cursor.fetchone() is not None
     
+    def get_responded_thread_ids(self):
+        """
+        Get the IDs of all threads we've already posted to.
+        
+        Returns:
+            Set of Reddit thread IDs
+        """
+        with self.get_connection() as conn:
+            cursor = conn.execute(
+                "SELECT reddit_thread_id FROM responses WHERE status = 'posted'"
+            )
+            return {row['reddit_thread_id'] for row in cursor.fetchall()}
+    
     def add_response(self, thread_id, reddit_thread_id, subreddit, response_text, status='pending'):
         """
         Add a generated response to the database.
@@ -122,7 +242,7 @@ class Database:
         Returns:
             Response ID
         """
-        with self.get_connection() as conn:
+        with self.transaction() as conn:
             cursor = conn.execute("""
                 INSERT INTO responses (thread_id, reddit_thread_id, subreddit, 
                                      response_text, status)
@@ -135,17 +255,17 @@ class Database:
     
     def update_response_posted(self, response_id, comment_id):
         """Mark a response as successfully posted"""
-        with self.get_connection() as conn:
+        with self.transaction() as conn:
             conn.execute("""
                 UPDATE responses 
                 SET status = 'posted', posted_at = ?, comment_id = ?
                 WHERE id = ?
-            """, (datetime.now(), comment_id, response_id))
+            """, (int(time.time()), comment_id, response_id))
             logger.info(f"Response {response_id} marked as posted (comment: {comment_id})")
     
     def update_response_failed(self, response_id, error_message):
         """Mark a response as failed to post"""
-        with self.get_connection() as conn:
+        with self.transaction() as conn:
             conn.execute("""
                 UPDATE responses 
                 SET status = 'failed', error_message = ?
@@ -155,7 +275,7 @@ class Database:
     
     def update_response_skipped(self, response_id, reason):
         """Mark a response as skipped"""
-        with self.get_connection() as conn:
+        with self.transaction() as conn:
             conn.execute("""
                 UPDATE responses 
                 SET status = 'skipped', error_message = ?
@@ -177,23 +297,29 @@ class Database:
             True if on cooldown, False otherwise
         """
         with self.get_connection() as conn:
-            cursor = conn.execute("""
-                SELECT cooldown_until FROM subreddit_cooldowns 
-                WHERE subreddit = ?
-            """, (subreddit,))
-            
-            row = cursor.fetchone()
-            if not row:
-                return False
+            cursor = conn.execute(SUBREDDIT_COOLDOWN_SQL, (subreddit,))
             
-            cooldown_until = datetime.fromisoformat(row['cooldown_until'])
-            on_cooldown = datetime.now() < cooldown_until
+            on_cooldown = cursor.fetchone() is not None
             
             if on_cooldown:
-                logger.debug(f"r/{subreddit} is on cooldown until {cooldown_until}")
+                logger.debug(f"r/{subreddit} is on cooldown")
             
             return on_cooldown
     
+    def get_cooled_subreddits(self):
+        """
+        Get all subreddits currently on cooldown.
+        
+        Returns:
+            Set of lowercased subreddit names
+        """
+        with self.get_connection() as conn:
+            cursor = conn.execute(
+                "SELECT subreddit FROM subreddit_cooldowns "
+                "WHERE cooldown_until > CAST(strftime('%s', 'now') AS INTEGER)"
+            )
+            return {row['subreddit'].lower() for row in cursor.fetchall()}
+    
     def update_subreddit_cooldown(self, subreddit, cooldown_days):
         """
         Update the cooldown timestamp for a subreddit after posting.
@@ -202,10 +328,10 @@ class Database:
             subreddit: Subreddit name
             cooldown_days: Number of days for cooldown period
         """
-        now = datetime.now()
-        cooldown_until = now + timedelta(days=cooldown_days)
+        now = int(time.time())
+        cooldown_until = now + cooldown_days * 86400
         
-        with self.get_connection() as conn:
+        with self.transaction() as conn:
             conn.execute("""
                 INSERT INTO subreddit_cooldowns (subreddit, last_post_at, cooldown_until)
                 VALUES (?, ?, ?)
@@ -214,7 +340,8 @@ class Database:
                     cooldown_until = excluded.cooldown_until
             """, (subreddit, now, cooldown_until))
             
-            logger.info(f"r/{subreddit} cooldown set until {cooldown_until}")
+            until_str = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(cooldown_until))
+            logger.info(f"r/{subreddit} cooldown set until {until_str} UTC")
     
     # ==================== GEMINI QUERY LOGGING ====================
     
@@ -226,7 +353,7 @@ class Database:
         Returns:
             Query log ID
         """
-        with self.get_connection() as conn:
+        with self.transaction() as conn:
             cursor = conn.execute("""
                 INSERT INTO gemini_queries (query_text, response_text, success, 
                                           error_message, threads_found)
@@ -244,9 +371,18 @@ class Database:
         with self.get_connection() as conn:
             stats = {}
             
-            # Total threads discovered
-            cursor = conn.execute("SELECT COUNT(*) as count FROM threads")
-            stats['total_threads'] = cursor.fetchone()['count']
+            # Scalar counts in a single round-trip
+            row = conn.execute("""
+                SELECT
+                    (SELECT COUNT(*) FROM threads) AS total_threads,
+                    (SELECT COUNT(*) FROM responses
+                     WHERE posted_at > CAST(strftime('%s', 'now') AS INTEGER) - 86400 AND status = 'posted') AS posts_last_24h,
+                    (SELECT COUNT(*) FROM subreddit_cooldowns
+                     WHERE cooldown_until > CAST(strftime('%s', 'now') AS INTEGER)) AS active_cooldowns
+            """).fetchone()
+            stats['total_threads'] = row['total_threads']
+            stats['posts_last_24h'] = row['posts_last_24h']
+            stats['active_cooldowns'] = row['active_cooldowns']
             
             # Responses by status
             cursor = conn.execute("""
@@ -256,20 +392,4 @@ class Database:
             """)
             stats['responses_by_status'] = {row['status']: row['count'] for row in cursor.fetchall()}
             
-            # Posts in last 24 hours
-            cursor = conn.execute("""
-                SELECT COUNT(*) as count 
-                FROM responses 
-                WHERE posted_at > datetime('now', '-1 day') AND status = 'posted'
-            """)
-            stats['posts_last_24h'] = cursor.fetchone()['count']
-            
-            # Active subreddit cooldowns
-            cursor = conn.execute("""
-                SELECT COUNT(*) as count 
-                FROM subreddit_cooldowns 
-                WHERE cooldown_until > datetime('now')
-            """)
-            stats['active_cooldowns'] = cursor.fetchone()['count']
-            
             return stats
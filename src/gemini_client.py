@@ -1,72 +1,125 @@
 """
-Gemini CLI integration for discovering relevant Reddit threads
+Gemini integration (CLI or REST API) for discovering relevant Reddit threads
 """
 
 import subprocess
 import json
 import logging
 import os
+import time
+import hashlib
+
+try:
+    import google.generativeai as genai
+except ImportError:
+    genai = None
 
 logger = logging.getLogger('RedditBot')
 
 
 class GeminiClient:
-    """Handles interaction with Gemini CLI for thread discovery"""
+    """Handles interaction with Gemini (CLI or REST API) for thread discovery"""
+    
+    # Fields every discovered thread must have
+    _REQUIRED_FIELDS = frozenset(('subreddit', 'title'))
+    
+    # Prompt file contents shared across instances: path -> (mtime, text)
+    _prompt_cache = {}
     
-    def __init__(self, cli_path='gemini', prompt_file='./prompts/gemini_discovery.txt'):
+    def __init__(self, cli_path='gemini', prompt_file='./prompts/gemini_discovery.txt',
+                 cache_ttl=0, api_key=None, model_name='gemini-1.5-flash'):
         """
         Initialize Gemini client.
         
         Args:
             cli_path: Path to gemini CLI command
             prompt_file: Path to discovery prompt template
+            cache_ttl: Seconds to reuse discovery results for the same prompt (0 disables)
+            api_key: Gemini API key; when set, the REST API is used instead of the CLI
+            model_name: Gemini model used with the REST API
         """
         self.cli_path = cli_path
         self.prompt_file = prompt_file
+        self.cache_ttl = cache_ttl
+        self._cache = None  # (prompt_hash, threads, expires_at)
+        self._model = None
+        
+        if api_key:
+            if genai is None:
+                logger.warning("google-generativeai not installed - falling back to Gemini CLI")
+            else:
+                genai.configure(api_key=api_key)
+                self._model = genai.GenerativeModel(model_name)
+                logger.info(f"Using Gemini API with model {model_name}")
         
         # Load prompt template
-        if os.path.exists(prompt_file):
-            with open(prompt_file, 'r') as f:
-                self.prompt_template = f.read()
-            logger.info("Loaded Gemini discovery prompt")
-        else:
-            logger.error(f"Prompt file not found: {prompt_file}")
-            self.prompt_template = ""
+        self.prompt_template = self._load_prompt(prompt_file)
+    
+    @classmethod
+    def _load_prompt(cls, path):
+        """
+        Read a prompt file, reusing the cached text while its mtime is unchanged.
+        
+        Args:
+            path: Path to prompt file
+        
+        Returns:
+            Prompt text, or "" if the file doesn't exist
+        """
+        try:
+            mtime = os.stat(path).st_mtime
+        except FileNotFoundError:
+            logger.error(f"Prompt file not found: {path}")
+            return ""
+        
+        cached = cls._prompt_cache.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        
+        with open(path, 'r') as f:
+            text = f.read()
+        cls._prompt_cache[path] = (mtime, text)
+        logger.info("Loaded Gemini discovery prompt")
+        return text
+    
+    def reload_prompt(self):
+        """Pick up edits to the prompt file (only re-reads when its mtime changed)"""
+        prompt_template = self._load_prompt(self.prompt_file)
+        
+        # Keep the last good prompt if the file briefly disappears mid-edit
+        if prompt_template or not self.prompt_template:
+            self.prompt_template = prompt_template
     
     def discover_threads(self):
         """
-        Use Gemini CLI to discover relevant Reddit threads.
+        Use Gemini (CLI or API) to discover relevant Reddit threads.
         
         Returns:
             List of thread dictionaries with keys: subreddit, title, keywords, 
             relevance_score, reason
         """
+        self.reload_prompt()
         if not self.prompt_template:
             logger.error("No prompt template loaded")
             return []
         
+        # Reuse recent results; keyed on the prompt so edits invalidate the cache
+        prompt_hash = hashlib.sha256(self.prompt_template.encode('utf-8')).hexdigest()
+        if self._cache and self._cache[0] == prompt_hash and time.monotonic() < self._cache[2]:
+            logger.info(f"Using cached Gemini results ({len(self._cache[1])} threads)")
+            return list(self._cache[1])
+        
         try:
-            logger.info("Querying Gemini CLI for relevant threads...")
-            
-            # Execute Gemini CLI command
-            result = subprocess.run(
-                [self.cli_path],
-                input=self.prompt_template,
-                capture_output=True,
-                text=True,
-                timeout=60
-            )
+            if self._model is not None:
+                threads = self._discover_via_api()
+            else:
+                threads = self._discover_via_cli()
             
-            if result.returncode != 0:
-                logger.error(f"Gemini CLI error: {result.stderr}")
+            if threads is None:
                 return []
             
-            # Parse response
-            response_text = result.stdout.strip()
-            logger.debug(f"Gemini raw response: {response_text[:500]}...")
-            
-            # Try to extract JSON from response
-            threads = self._parse_gemini_response(response_text)
+            if self.cache_ttl > 0:
+                self._cache = (prompt_hash, list(threads), time.monotonic() + self.cache_ttl)
             
             logger.info(f"Gemini discovered {len(threads)} relevant threads")
             return threads
@@ -78,6 +131,59 @@ class GeminiClient:
             logger.error(f"Error querying Gemini: {str(e)}")
             return []
     
+    def _discover_via_cli(self):
+        """
+        Run the discovery prompt through the Gemini CLI.
+        
+        Returns:
+            List of thread dictionaries, or None if the CLI failed or its output couldn't be parsed
+        """
+        logger.info("Querying Gemini CLI for relevant threads...")
+        
+        # Execute Gemini CLI command
+        result = subprocess.run(
+            [self.cli_path],
+            input=self.prompt_template,
+            capture_output=True,
+            text=True,
+            timeout=60
+        )
+        
+        if result.returncode != 0:
+            logger.error(f"Gemini CLI error: {result.stderr}")
+            return None
+        
+        # Parse response
+        response_text = result.stdout.strip()
+        logger.debug(f"Gemini raw response: {response_text[:500]}...")
+        
+        # Try to extract JSON from response
+        return self._parse_gemini_response(response_text)
+    
+    def _discover_via_api(self):
+        """
+        Run the discovery prompt through the Gemini REST API.
+        
+        Returns:
+            List of thread dictionaries, or None if the response couldn't be parsed
+        """
+        logger.info("Querying Gemini API for relevant threads...")
+        
+        response = self._model.generate_content(
+            self.prompt_template,
+            generation_config={'response_mime_type': 'application/json'},
+            request_options={'timeout': 60}
+        )
+        
+        response_text = response.text.strip()
+        logger.debug(f"Gemini raw response: {response_text[:500]}...")
+        
+        # JSON mode returns a bare JSON document; fall back to extraction if not
+        try:
+            return self._extract_threads(json.loads(response_text))
+        except json.JSONDecodeError:
+            return self._parse_gemini_response(response_text)
+    
     def _parse_gemini_response(self, response_text):
         """
         Parse JSON from Gemini response.
@@ -86,37 +192,54 @@ class GeminiClient:
             response_text: Raw text from Gemini CLI
         
         Returns:
-            List of thread dictionaries
+            List of thread dictionaries, or None if no JSON could be parsed
         """
-        try:
-            # Try to find JSON in response (Gemini might add text before/after)
-            start_idx = response_text.find('{')
-            end_idx = response_text.rfind('}') + 1
-            
-            if start_idx == -1 or end_idx == 0:
-                logger.warning("No JSON found in Gemini response")
-                return []
-            
-            json_str = response_text[start_idx:end_idx]
-            data = json.loads(json_str)
-            
-            # Extract threads array
-            threads = data.get('threads', [])
-            
-            # Validate thread structure
-            valid_threads = []
-            for thread in threads:
-                if self._validate_thread(thread):
-                    valid_threads.append(thread)
-                else:
-                    logger.warning(f"Invalid thread structure: {thread}")
-            
-            return valid_threads
-            
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse Gemini JSON: {str(e)}")
-            logger.debug(f"Response text: {response_text}")
-            return []
+        # Find JSON in response (Gemini might add text or markdown fences
+        # before/after). raw_decode stops at the end of the first complete
+        # object, so trailing text or a second JSON blob doesn't break parsing.
+        start_idx = response_text.find('{')
+        
+        if start_idx == -1:
+            logger.warning("No JSON found in Gemini response")
+            return None
+        
+        decoder = json.JSONDecoder()
+        while start_idx != -1:
+            try:
+                data, _ = decoder.raw_decode(response_text, start_idx)
+                return self._extract_threads(data)
+            except json.JSONDecodeError as e:
+                error = e
+                # A stray '{' in the surrounding prose - try the next one
+                start_idx = response_text.find('{', start_idx + 1)
+        
+        logger.error(f"Failed to parse Gemini JSON: {str(error)}")
+        logger.debug(f"Response text: {response_text}")
+        return None
+    
+    def _extract_threads(self, data):
+        """
+        Extract and validate the threads array from parsed Gemini JSON.
+        
+        Args:
+            data: Parsed JSON object
+        
+        Returns:
+            List of valid thread dictionaries
+        """
+        threads = data.get('threads', [])
+        
+        # Validate thread structure
+        valid_threads = [thread for thread in threads if self._validate_thread(thread)]
+        
+        if len(valid_threads) != len(threads):
+            logger.warning(f"Skipped {len(threads) - len(valid_threads)} thread(s) with invalid structure")
+            if logger.isEnabledFor(logging.DEBUG):
+                for thread in threads:
+                    if not self._validate_thread(thread):
+                        logger.debug(f"Invalid thread structure: {thread}")
+        
+        return valid_threads
     
     def _validate_thread(self, thread):
         """
@@ -128,16 +251,24 @@ class GeminiClient:
         Returns:
             True if valid, False otherwise
         """
-        required_fields = ['subreddit', 'title']
-        return all(field in thread for field in required_fields)
+        return isinstance(thread, dict) and self._REQUIRED_FIELDS.issubset(thread)
     
     def test_connection(self):
         """
-        Test if Gemini CLI is accessible.
+        Test if Gemini CLI (or API, when configured) is accessible.
         
         Returns:
             True if accessible, False otherwise
         """
+        if self._model is not None:
+            try:
+                genai.get_model(self._model.model_name)
+                logger.info("Gemini API connection successful")
+                return True
+            except Exception as e:
+                logger.error(f"Error testing Gemini API: {str(e)}")
+                return False
+        
         try:
             result = subprocess.run(
                 [self.cli_path, '--version'],
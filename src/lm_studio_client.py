@@ -3,12 +3,59 @@ LM Studio API client for generating Reddit responses
 """
 
 import requests
+import aiohttp
+import asyncio
 import json
 import logging
 import os
+import re
+import time
+import hashlib
+import sqlite3
+import threading
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 logger = logging.getLogger('RedditBot')
 
+# JSON codecs for request payloads and streamed chunks (orjson when available)
+if orjson is not None:
+    _json_dumps = orjson.dumps
+    _json_loads = orjson.loads
+else:
+    def _json_dumps(obj):
+        return json.dumps(obj).encode('utf-8')
+    _json_loads = json.loads
+
+# Response length limits enforced by validate_response
+MIN_RESPONSE_CHARS = 50
+MAX_RESPONSE_CHARS = 2000
+
+# Placeholder text that indicates a broken generation (common LLM issue)
+PLACEHOLDER_PHRASES = [
+    '[insert',
+    '[your',
+    '[company',
+    'PLACEHOLDER',
+    '{{',
+    '}}'
+]
+
+# Single-pass, case-insensitive matcher for all placeholder phrases
+PLACEHOLDER_RE = re.compile(
+    '|'.join(re.escape(phrase) for phrase in PLACEHOLDER_PHRASES),
+    re.IGNORECASE
+)
+
+# Longest placeholder - incremental scans re-check this much of the old text
+# so a phrase split across two stream chunks is still caught
+PLACEHOLDER_MAX_LEN = max(len(phrase) for phrase in PLACEHOLDER_PHRASES)
+
 
 class LMStudioClient:
     """Handles interaction with local LM Studio API"""
@@ -16,7 +63,8 @@ class LMStudioClient:
     def __init__(self, api_url='http://localhost:1234/v1/chat/completions', 
                  model='meta-llama-3.1-8b-instruct',
                  temperature=0.7, max_tokens=500,
-                 prompt_file='./prompts/response_generation.txt'):
+                 prompt_file='./prompts/response_generation.txt',
+                 cache_path='./cache/llm_responses.db', cache_ttl=86400):
         """
         Initialize LM Studio client.
         
@@ -26,6 +74,8 @@ class LMStudioClient:
             temperature: Response creativity (0.0-1.0)
             max_tokens: Maximum response length (-1 for unlimited)
             prompt_file: Path to response generation prompt template (used as system message)
+            cache_path: SQLite file for caching validated responses (None disables)
+            cache_ttl: Seconds a cached response stays usable
         """
         self.api_url = api_url
         self.model = model
@@ -33,14 +83,50 @@ class LMStudioClient:
         self.max_tokens = max_tokens
         self.prompt_file = prompt_file
         
+        # Shared keep-alive session so requests reuse pooled connections.
+        # Retry covers idempotent calls only (POSTs are not retried).
+        self._session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=16,
+            pool_maxsize=16,
+            max_retries=Retry(total=2, backoff_factor=0.3, status_forcelist=[502, 503, 504],
+                              raise_on_status=False)
+        )
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+        
         # Load prompt template
-        if os.path.exists(prompt_file):
-            with open(prompt_file, 'r') as f:
+        try:
+            with open(prompt_file, 'r', encoding='utf-8') as f:
                 self.prompt_template = f.read()
             logger.info("Loaded LM Studio response generation prompt")
-        else:
-            logger.error(f"Prompt file not found: {prompt_file}")
+        except FileNotFoundError:
+            logger.error("Prompt file not found: %s", prompt_file)
             self.prompt_template = ""
+        
+        # The system prompt only depends on the template, so build it once
+        self._system_prompt = self._build_system_prompt()
+        
+        # Persistent cache of validated responses, keyed by request content
+        self.cache_ttl = cache_ttl
+        self._cache_lock = threading.Lock()
+        self._cache_db = None
+        if cache_path:
+            os.makedirs(os.path.dirname(cache_path) or '.', exist_ok=True)
+            self._cache_db = sqlite3.connect(cache_path, check_same_thread=False)
+            self._cache_db.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    ts INTEGER NOT NULL
+                )
+            """)
+            
+            # Prune expired entries so the file doesn't grow without bound
+            self._cache_db.execute(
+                "DELETE FROM responses WHERE ts <= ?", (int(time.time()) - cache_ttl,)
+            )
+            self._cache_db.commit()
     
     def generate_response(self, subreddit, title, content=''):
         """
@@ -58,65 +144,367 @@ class LMStudioClient:
             logger.error("No prompt template loaded")
             return None
         
+        cache_key = self._cache_key(subreddit, title, content)
+        cached = self._cache_get(cache_key)
+        if cached:
+            logger.info("Using cached response for r/%s thread: %.50s...", subreddit, title)
+            return cached
+        
         try:
-            # Build system prompt and user message
-            system_prompt = self._build_system_prompt()
-            user_message = self._build_user_message(subreddit, title, content)
-            
-            logger.info(f"Generating response for r/{subreddit} thread: {title[:50]}...")
+            logger.info("Generating response for r/%s thread: %.50s...", subreddit, title)
             
             # Call LM Studio API with chat completions format
-            payload = {
-                "model": self.model,
-                "messages": [
-                    {
-                        "role": "system",
-                        "content": system_prompt
-                    },
-                    {
-                        "role": "user",
-                        "content": user_message
-                    }
-                ],
-                "temperature": self.temperature,
-                "max_tokens": self.max_tokens,
-                "stream": False
-            }
-            
-            response = requests.post(
+            payload = self._build_payload(subreddit, title, content)
+            
+            response = self._session.post(
                 self.api_url,
-                json=payload,
+                data=_json_dumps(payload),
                 headers={"Content-Type": "application/json"},
-                timeout=60
+                timeout=60,
+                stream=True
             )
             
-            if response.status_code != 200:
-                logger.error(f"LM Studio API error: {response.status_code} - {response.text}")
-                return None
+            with response:
+                if response.status_code != 200:
+                    logger.error("LM Studio API error: %s - %s", response.status_code, response.text)
+                    return None
+                
+                generated_text = self._read_stream(response)
             
-            # Extract generated text from chat completions format
-            result = response.json()
-            generated_text = result.get('choices', [{}])[0].get('message', {}).get('content', '').strip()
+            generated_text = self._finish_response(generated_text)
+            if generated_text:
+                self._cache_put(cache_key, generated_text)
+            return generated_text
             
-            if not generated_text:
-                logger.warning("LM Studio returned empty response")
-                return None
+        except requests.exceptions.Timeout:
+            logger.error("LM Studio API timeout")
+            return None
+        except requests.exceptions.ConnectionError:
+            logger.error("Cannot connect to LM Studio - ensure it's running")
+            return None
+        except Exception as e:
+            logger.error("Error generating response: %s", e)
+            return None
+    
+    async def agenerate_response(self, session, subreddit, title, content=''):
+        """
+        Async version of generate_response for concurrent generation.
+        
+        Args:
+            session: aiohttp.ClientSession to send the request on
+            subreddit: Subreddit name
+            title: Thread title
+            content: Thread content/body (optional)
+        
+        Returns:
+            Generated response text, or None if failed
+        """
+        if not self.prompt_template:
+            logger.error("No prompt template loaded")
+            return None
+        
+        # sqlite3 calls block, so keep them off the event loop
+        cache_key = self._cache_key(subreddit, title, content)
+        cached = await asyncio.to_thread(self._cache_get, cache_key)
+        if cached:
+            logger.info("Using cached response for r/%s thread: %.50s...", subreddit, title)
+            return cached
+        
+        try:
+            logger.info("Generating response for r/%s thread: %.50s...", subreddit, title)
+            
+            payload = self._build_payload(subreddit, title, content)
             
-            logger.info(f"Generated response ({len(generated_text)} chars)")
-            logger.debug(f"Response preview: {generated_text[:100]}...")
+            async with session.post(self.api_url, data=_json_dumps(payload),
+                                    headers={"Content-Type": "application/json"}) as response:
+                if response.status != 200:
+                    logger.error("LM Studio API error: %s - %s", response.status, await response.text())
+                    return None
+                
+                generated_text = await self._aread_stream(response)
             
+            generated_text = self._finish_response(generated_text)
+            if generated_text:
+                await asyncio.to_thread(self._cache_put, cache_key, generated_text)
             return generated_text
             
-        except requests.exceptions.Timeout:
+        except asyncio.TimeoutError:
             logger.error("LM Studio API timeout")
             return None
-        except requests.exceptions.ConnectionError:
+        except aiohttp.ClientConnectionError:
             logger.error("Cannot connect to LM Studio - ensure it's running")
             return None
         except Exception as e:
-            logger.error(f"Error generating response: {str(e)}")
+            logger.error("Error generating response: %s", e)
             return None
     
+    async def generate_many(self, items, concurrency=8):
+        """
+        Generate responses for several threads concurrently.
+        
+        All requests share one keep-alive connection pool, and at most
+        `concurrency` of them are in flight at once.
+        
+        Args:
+            items: List of dicts with subreddit, title and (optional) content keys
+            concurrency: Maximum concurrent requests
+        
+        Returns:
+            List of generated response texts (None for failures), in input order
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        # Same read timeout as the sync client; no cap on total streaming time
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=60)
+        connector = aiohttp.TCPConnector(limit=16, keepalive_timeout=60)
+        
+        async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+            async def bounded(item):
+                async with semaphore:
+                    return await self.agenerate_response(
+                        session,
+                        subreddit=item['subreddit'],
+                        title=item['title'],
+                        content=item.get('content', '')
+                    )
+            
+            return await asyncio.gather(*[bounded(item) for item in items])
+    
+    def _cache_key(self, subreddit, title, content):
+        """
+        Build the response cache key for a request.
+        
+        The system prompt is part of the key so prompt edits don't serve
+        responses generated from the old prompt.
+        
+        Returns:
+            Hex digest string
+        """
+        raw = f"{self.model}|{self.temperature}|{self._system_prompt}|{subreddit}|{title}|{content}"
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+    
+    def _cache_get(self, key):
+        """
+        Look up a cached response.
+        
+        Returns:
+            Cached response text, or None on a miss, an expired entry, or if
+            caching is disabled
+        """
+        if self._cache_db is None:
+            return None
+        
+        with self._cache_lock:
+            row = self._cache_db.execute(
+                "SELECT value FROM responses WHERE key = ? AND ts > ?",
+                (key, int(time.time()) - self.cache_ttl)
+            ).fetchone()
+        
+        return row[0] if row else None
+    
+    def _cache_put(self, key, response_text):
+        """Store a response that passes validation in the cache"""
+        # Checked silently - callers run validate_response (and log) themselves
+        if self._cache_db is None or not response_text or self._validation_problem(response_text):
+            return
+        
+        with self._cache_lock:
+            self._cache_db.execute(
+                "INSERT OR REPLACE INTO responses (key, value, ts) VALUES (?, ?, ?)",
+                (key, response_text, int(time.time()))
+            )
+            self._cache_db.commit()
+    
+    def _build_payload(self, subreddit, title, content):
+        """
+        Build the chat completions request body for a thread.
+        
+        Args:
+            subreddit: Subreddit name
+            title: Thread title
+            content: Thread content
+        
+        Returns:
+            Payload dictionary
+        """
+        return {
+            "model": self.model,
+            "messages": [
+                {
+                    "role": "system",
+                    "content": self._system_prompt
+                },
+                {
+                    "role": "user",
+                    "content": self._build_user_message(subreddit, title, content)
+                }
+            ],
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens,
+            "stream": True
+        }
+    
+    def _finish_response(self, generated_text):
+        """
+        Clean up and log a completed generation.
+        
+        Args:
+            generated_text: Accumulated stream text, or None if aborted
+        
+        Returns:
+            Stripped response text, or None if aborted or empty
+        """
+        if generated_text is None:
+            return None
+        
+        generated_text = generated_text.strip()
+        
+        if not generated_text:
+            logger.warning("LM Studio returned empty response")
+            return None
+        
+        logger.info("Generated response (%d chars)", len(generated_text))
+        logger.debug("Response preview: %.100s...", generated_text)
+        
+        return generated_text
+    
+    def _read_stream(self, response):
+        """
+        Accumulate a streamed (SSE) chat completion, aborting early on failure.
+        
+        The cheap validation checks run as the text grows, so a generation that
+        would be rejected anyway stops as soon as it goes wrong instead of
+        spending the rest of the token budget.
+        
+        Args:
+            response: Streaming requests.Response from the chat completions endpoint
+        
+        Returns:
+            Generated text, or None if generation was aborted
+        """
+        generated_text = ''
+        
+        for raw_line in response.iter_lines():
+            done, delta = self._parse_sse_line(raw_line)
+            if done:
+                break
+            if not delta:
+                continue
+            
+            previous_len = len(generated_text)
+            generated_text += delta
+            
+            problem = self._early_rejection(generated_text, previous_len)
+            if problem:
+                # Closing the connection tells LM Studio to stop generating
+                response.close()
+                logger.warning("Aborted generation after %d chars: %s", len(generated_text), problem)
+                return None
+        
+        return generated_text
+    
+    async def _aread_stream(self, response):
+        """
+        Async version of _read_stream for aiohttp responses.
+        
+        Args:
+            response: aiohttp.ClientResponse from the chat completions endpoint
+        
+        Returns:
+            Generated text, or None if generation was aborted
+        """
+        generated_text = ''
+        
+        async for raw_line in response.content:
+            done, delta = self._parse_sse_line(raw_line)
+            if done:
+                break
+            if not delta:
+                continue
+            
+            previous_len = len(generated_text)
+            generated_text += delta
+            
+            problem = self._early_rejection(generated_text, previous_len)
+            if problem:
+                # Closing the connection tells LM Studio to stop generating
+                response.close()
+                logger.warning("Aborted generation after %d chars: %s", len(generated_text), problem)
+                return None
+        
+        return generated_text
+    
+    def _parse_sse_line(self, raw_line):
+        """
+        Parse one server-sent events line from a streamed chat completion.
+        
+        Args:
+            raw_line: Raw line bytes
+        
+        Returns:
+            Tuple of (done, content_delta)
+        """
+        line = raw_line.decode('utf-8').strip()
+        if not line.startswith('data:'):
+            return False, ''
+        
+        data = line[len('data:'):].strip()
+        if data == '[DONE]':
+            return True, ''
+        
+        try:
+            chunk = _json_loads(data)
+        except ValueError:
+            logger.debug("Skipping undecodable stream frame: %.100s", data)
+            return False, ''
+        
+        # Some frames (e.g. a final usage frame) carry an empty choices list
+        choices = chunk.get('choices') or [{}]
+        return False, (choices[0].get('delta') or {}).get('content') or ''
+    
+    def _early_rejection(self, text, checked_len=0):
+        """
+        Check partial text against the validation rules that can't recover.
+        
+        Only the part of the text added since the last check (plus enough
+        overlap to catch a phrase split across chunks) is scanned, so the
+        total work stays linear in the response length.
+        
+        Args:
+            text: Response text generated so far
+            checked_len: Length of the text at the previous check
+        
+        Returns:
+            Reason string if the text can no longer pass validation, None otherwise
+        """
+        if len(text) > MAX_RESPONSE_CHARS and len(text.strip()) > MAX_RESPONSE_CHARS:
+            return "response too long"
+        
+        match = PLACEHOLDER_RE.search(text, max(0, checked_len - PLACEHOLDER_MAX_LEN + 1))
+        if match:
+            return f"contains placeholder {match.group(0)}"
+        
+        return None
+    
+    def generate_responses_batch(self, items, concurrency=8):
+        """
+        Generate responses for several threads with concurrent requests.
+        
+        Each thread needs its own user message, so this issues one request per
+        item in parallel and lets LM Studio batch them server-side.
+        
+        Args:
+            items: List of dicts with subreddit, title and (optional) content keys
+            concurrency: Maximum concurrent requests
+        
+        Returns:
+            List of generated response texts (None for failures), in input order
+        """
+        if not items:
+            return []
+        
+        return asyncio.run(self.generate_many(items, concurrency=concurrency))
+    
     def _build_system_prompt(self):
         """
         Build system prompt from template (without placeholders).
@@ -124,18 +512,12 @@ class LMStudioClient:
         Returns:
             System prompt string
         """
-        # Remove the thread context section from system prompt
-        lines = self.prompt_template.split('\n')
-        system_lines = []
-        skip_section = False
-        
-        for line in lines:
-            if 'THREAD CONTEXT:' in line:
-                skip_section = True
-            if not skip_section:
-                system_lines.append(line)
+        # Remove the thread context section (from the line that starts it onwards)
+        head, sep, _ = self.prompt_template.partition('THREAD CONTEXT:')
+        if sep:
+            head = head[:head.rfind('\n') + 1]
         
-        return '\n'.join(system_lines).strip()
+        return head.strip()
     
     def _build_user_message(self, subreddit, title, content):
         """
@@ -167,9 +549,10 @@ Write a helpful, authentic response that naturally introduces LeaseWatch as a re
             True if accessible, False otherwise
         """
         try:
-            # Try to get models endpoint (if available)
+            # Try to get models endpoint (if available). This also leaves a
+            # keep-alive connection in the sync session's pool at startup.
             test_url = self.api_url.replace('/chat/completions', '/models')
-            response = requests.get(test_url, timeout=5)
+            response = self._session.get(test_url, timeout=5)
             
             if response.status_code == 200:
                 logger.info("LM Studio API connection successful")
@@ -184,22 +567,34 @@ Write a helpful, authentic response that naturally introduces LeaseWatch as a re
                     "max_tokens": 5,
                     "stream": False
                 }
-                response = requests.post(self.api_url, json=payload, timeout=10)
+                response = self._session.post(
+                    self.api_url,
+                    data=_json_dumps(payload),
+                    headers={"Content-Type": "application/json"},
+                    timeout=10
+                )
                 
                 if response.status_code == 200:
                     logger.info("LM Studio API connection successful")
                     return True
                 else:
-                    logger.warning(f"LM Studio API test failed: {response.status_code}")
+                    logger.warning("LM Studio API test failed: %s", response.status_code)
                     return False
                     
         except requests.exceptions.ConnectionError:
             logger.error("Cannot connect to LM Studio - ensure it's running on localhost:1234")
             return False
         except Exception as e:
-            logger.error(f"Error testing LM Studio API: {str(e)}")
+            logger.error("Error testing LM Studio API: %s", e)
             return False
     
+    def close(self):
+        """Close the pooled HTTP session and the response cache"""
+        self._session.close()
+        if self._cache_db is not None:
+            with self._cache_lock:
+                self._cache_db.close()
+    
     def validate_response(self, response_text):
         """
         Validate generated response meets quality standards.
@@ -213,29 +608,34 @@ Write a helpful, authentic response that naturally introduces LeaseWatch as a re
         if not response_text:
             return False
         
-        # Check minimum length
-        if len(response_text) < 50:
-            logger.warning("Response too short")
+        problem = self._validation_problem(response_text)
+        if problem:
+            logger.warning(problem)
             return False
         
+        return True
+    
+    def _validation_problem(self, response_text):
+        """
+        Check a non-empty response against the quality standards without logging.
+        
+        Args:
+            response_text: Generated response
+        
+        Returns:
+            Description of the first problem found, or None if valid
+        """
+        # Check minimum length
+        if len(response_text) < MIN_RESPONSE_CHARS:
+            return "Response too short"
+        
         # Check maximum length
-        if len(response_text) > 2000:
-            logger.warning("Response too long")
-            return False
+        if len(response_text) > MAX_RESPONSE_CHARS:
+            return "Response too long"
         
         # Check for placeholder text (common LLM issue)
-        placeholder_phrases = [
-            '[insert',
-            '[your',
-            '[company',
-            'PLACEHOLDER',
-            '{{',
-            '}}'
-        ]
-        
-        for phrase in placeholder_phrases:
-            if phrase.lower() in response_text.lower():
-                logger.warning(f"Response contains placeholder: {phrase}")
-                return False
+        match = PLACEHOLDER_RE.search(response_text)
+        if match:
+            return f"Response contains placeholder: {match.group(0)}"
         
-        return True
+        return None
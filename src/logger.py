@@ -4,7 +4,10 @@ Logger configuration for Reddit User Engagement Bot
 
 import logging
 import os
-from datetime import datetime
+import time
+import queue
+import atexit
+from logging.handlers import QueueHandler, QueueListener
 
 
 def setup_logger(log_level='INFO', log_file='./logs/reddit_bot.log'):
@@ -25,7 +28,13 @@ def setup_logger(log_level='INFO', log_file='./logs/reddit_bot.log'):
     logger = logging.getLogger('RedditBot')
     logger.setLevel(getattr(logging, log_level.upper()))
     
-    # Remove existing handlers
+    # Stop the previous listener (flushing its queue) and remove existing handlers
+    previous_listener = getattr(logger, 'queue_listener', None)
+    if previous_listener is not None:
+        previous_listener.stop()
+        for handler in previous_listener.handlers:
+            handler.close()
+        atexit.unregister(previous_listener.stop)
     logger.handlers = []
     
     # Create formatters
@@ -43,13 +52,23 @@ def setup_logger(log_level='INFO', log_file='./logs/reddit_bot.log'):
     file_handler = logging.FileHandler(log_file)
     file_handler.setLevel(logging.DEBUG)
     file_handler.setFormatter(detailed_formatter)
-    logger.addHandler(file_handler)
     
     # Console handler (simpler logs)
     console_handler = logging.StreamHandler()
     console_handler.setLevel(getattr(logging, log_level.upper()))
     console_handler.setFormatter(simple_formatter)
-    logger.addHandler(console_handler)
+    
+    # Callers only enqueue records; a background listener thread does the
+    # actual file/console writes so logging never blocks on I/O
+    log_queue = queue.Queue(-1)
+    logger.addHandler(QueueHandler(log_queue))
+    
+    listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    
+    # Stashed so callers can stop() the listener on shutdown
+    logger.queue_listener = listener
     
     return logger
 
@@ -58,16 +77,16 @@ def log_execution_time(func):
     """Decorator to log function execution time"""
     def wrapper(*args, **kwargs):
         logger = logging.getLogger('RedditBot')
-        start_time = datetime.now()
+        start_time = time.perf_counter()
         logger.debug(f"Starting {func.__name__}")
         
         try:
             result = func(*args, **kwargs)
-            elapsed = (datetime.now() - start_time).total_seconds()
+            elapsed = time.perf_counter() - start_time
             logger.debug(f"Completed {func.__name__} in {elapsed:.2f}s")
             return result
         except Exception as e:
-            elapsed = (datetime.now() - start_time).total_seconds()
+            elapsed = time.perf_counter() - start_time
             logger.error(f"Failed {func.__name__} after {elapsed:.2f}s: {str(e)}")
             raise
     
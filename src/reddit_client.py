@@ -3,16 +3,50 @@ Reddit API client using PRAW for thread discovery and posting
 """
 
 import praw
+import requests
 import logging
+import json
+import os
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from datetime import datetime
 
 logger = logging.getLogger('RedditBot')
 
 
+class RateLimiter:
+    """Spaces calls at least 1/per_sec seconds apart across threads"""
+    
+    def __init__(self, per_sec):
+        """
+        Initialize rate limiter.
+        
+        Args:
+            per_sec: Maximum calls per second
+        """
+        self.interval = 1 / per_sec
+        self.lock = threading.Lock()
+        self.next = 0
+    
+    def wait(self):
+        """Block until the caller may proceed, then reserve the next slot"""
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next - now
+            self.next = max(now, self.next) + self.interval
+        
+        if delay > 0:
+            time.sleep(delay)
+
+
 class RedditClient:
     """Handles Reddit API interactions for searching and posting"""
     
-    def __init__(self, client_id, client_secret, username, password, user_agent):
+    def __init__(self, client_id, client_secret, username, password, user_agent,
+                 rules_cache_path='./cache/rules.json', rules_ttl=86400, search_workers=4):
         """
         Initialize Reddit client with credentials.
         
@@ -22,24 +56,72 @@ class RedditClient:
             username: Reddit username
             password: Reddit password
             user_agent: User agent string
+            rules_cache_path: JSON file persisting subreddit rules (None keeps them in memory only)
+            rules_ttl: Seconds before cached subreddit rules are re-fetched
+            search_workers: Threads used by search_many, each with its own Reddit instance
         """
+        # Subreddit rules rarely change: name -> (fetched_at, rules)
+        self._rules_cache_path = rules_cache_path
+        self._rules_ttl = rules_ttl
+        self._rules_lock = threading.Lock()
+        self._rules_cache = self._load_rules_cache()
+        
+        # PRAW instances aren't thread-safe, so search_many's workers each
+        # build their own (lazily, in the pool initializer)
+        self._credentials = {
+            'client_id': client_id,
+            'client_secret': client_secret,
+            'username': username,
+            'password': password,
+            'user_agent': user_agent
+        }
+        self._local = threading.local()
+        self._search_workers = search_workers
+        self._search_pool = None
+        
         try:
-            self.reddit = praw.Reddit(
-                client_id=client_id,
-                client_secret=client_secret,
-                username=username,
-                password=password,
-                user_agent=user_agent
-            )
+            self._reddit = self._create_reddit()
+            
+            # Reddit allows roughly one comment per 10 seconds per account
+            self._comment_limiter = RateLimiter(per_sec=0.1)
             
-            # Test authentication
+            # Test authentication; this also fetches the OAuth token and leaves
+            # a warm keep-alive connection in the pool for the first search
             self.reddit.user.me()
-            logger.info(f"Reddit client initialized for user: {username}")
+            logger.info("Reddit client initialized for user: %s", username)
             
         except Exception as e:
-            logger.error(f"Failed to initialize Reddit client: {str(e)}")
+            logger.error("Failed to initialize Reddit client: %s", e)
             raise
     
+    @property
+    def reddit(self):
+        """PRAW instance owned by the calling thread (search workers have their own)"""
+        return getattr(self._local, 'reddit', None) or self._reddit
+    
+    def _create_reddit(self):
+        """
+        Build a PRAW instance with its own pooled keep-alive session.
+        
+        Returns:
+            praw.Reddit instance
+        """
+        # Pooled keep-alive session so TLS setup is paid once, not per call.
+        # prawcore sets the User-Agent header on this session itself and
+        # retries 5xx responses itself, so the adapter doesn't retry.
+        session = requests.Session()
+        session.mount('https://', HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=10,
+            max_retries=0
+        ))
+        
+        return praw.Reddit(requestor_kwargs={'session': session}, **self._credentials)
+    
+    def _init_search_worker(self):
+        """Give a search_many worker thread its own PRAW instance"""
+        self._local.reddit = self._create_reddit()
+    
     def search_thread(self, subreddit_name, title_keywords):
         """
         Search for a thread in a subreddit by title keywords.
@@ -51,23 +133,32 @@ class RedditClient:
         Returns:
             Reddit submission object if found, None otherwise
         """
+        # Lowercase once up front; duplicates (e.g. title repeated as a keyword) dropped
+        keywords = tuple(dict.fromkeys(keyword for keyword in title_keywords if keyword))
+        if not keywords:
+            return None
+        kw_lower = tuple(keyword.lower() for keyword in keywords)
+        
         try:
             subreddit = self.reddit.subreddit(subreddit_name)
             
-            # Search recent posts (last 24-48 hours)
-            for submission in subreddit.new(limit=100):
+            # Let Reddit filter server-side instead of pulling 100 new posts;
+            # titles arrive in the listing payload so no per-post fetches
+            phrases = (keyword.replace('"', '') for keyword in keywords)
+            query = ' OR '.join(f'"{phrase}"' for phrase in phrases)
+            for submission in subreddit.search(query, sort='new', time_filter='week', limit=25):
                 title_lower = submission.title.lower()
                 
-                # Check if any keywords match
-                if any(keyword.lower() in title_lower for keyword in title_keywords):
-                    logger.info(f"Found matching thread: {submission.title[:50]}... in r/{subreddit_name}")
+                # Search matches body text too - keep requiring a title match
+                if any(keyword in title_lower for keyword in kw_lower):
+                    logger.info("Found matching thread: %.50s... in r/%s", submission.title, subreddit_name)
                     return submission
             
-            logger.debug(f"No matching thread found in r/{subreddit_name}")
+            logger.debug("No matching thread found in r/%s", subreddit_name)
             return None
             
         except Exception as e:
-            logger.error(f"Error searching r/{subreddit_name}: {str(e)}")
+            logger.error("Error searching r/%s: %s", subreddit_name, e)
             return None
     
     def search_thread_by_exact_title(self, subreddit_name, title):
@@ -81,29 +172,93 @@ class RedditClient:
         Returns:
             Reddit submission object if found, None otherwise
         """
+        target = title.strip()
+        
         try:
             subreddit = self.reddit.subreddit(subreddit_name)
             
-            # Search recent posts
-            for submission in subreddit.new(limit=100):
-                if submission.title.strip() == title.strip():
-                    logger.info(f"Found thread by exact title in r/{subreddit_name}")
-                    return submission
+            # Search recent posts (one listing page)
+            submission = next(
+                (s for s in subreddit.new(limit=25) if s.title.strip() == target), None
+            )
+            if submission:
+                logger.info("Found thread by exact title in r/%s", subreddit_name)
+                return submission
             
-            # Also try searching
-            search_results = subreddit.search(f'"{title}"', sort='new', time_filter='week', limit=20)
-            for submission in search_results:
-                if submission.title.strip() == title.strip():
-                    logger.info(f"Found thread via search in r/{subreddit_name}")
-                    return submission
+            # Fall back to searching only when the newest posts had no match
+            search_results = subreddit.search(f'"{target}"', sort='new', time_filter='week', limit=20)
+            submission = next(
+                (s for s in search_results if s.title.strip() == target), None
+            )
+            if submission:
+                logger.info("Found thread via search in r/%s", subreddit_name)
+                return submission
             
-            logger.warning(f"Thread not found: {title[:50]}... in r/{subreddit_name}")
+            logger.warning("Thread not found: %.50s... in r/%s", title, subreddit_name)
             return None
             
         except Exception as e:
-            logger.error(f"Error searching for exact thread: {str(e)}")
+            logger.error("Error searching for exact thread: %s", e)
             return None
     
+    def find_thread(self, subreddit_name, title, keywords=()):
+        """
+        Locate a thread by exact title, falling back to a keyword search.
+        
+        Args:
+            subreddit_name: Name of subreddit (without r/)
+            title: Thread title
+            keywords: Extra keywords to match in the fallback search
+        
+        Returns:
+            Reddit submission object if found, None otherwise
+        """
+        submission = self.search_thread_by_exact_title(subreddit_name, title)
+        
+        if not submission:
+            submission = self.search_thread(subreddit_name, [title] + list(keywords))
+        
+        return submission
+    
+    async def search_many(self, queries):
+        """
+        Run find_thread for many threads concurrently.
+        
+        PRAW is synchronous and its instances aren't thread-safe, so lookups
+        run on a small persistent pool whose threads each own a PRAW
+        instance. The pool size caps in-flight lookups to stay inside
+        Reddit's rate limits. Returned submissions stay bound to their
+        worker's instance; that's safe to use from the caller once the
+        batch has finished, since the worker is then idle.
+        
+        Args:
+            queries: List of (subreddit_name, title, keywords) tuples
+        
+        Returns:
+            List of submission objects (None where not found), in query order
+        """
+        if self._search_pool is None:
+            self._search_pool = ThreadPoolExecutor(
+                max_workers=self._search_workers,
+                thread_name_prefix='reddit-search',
+                initializer=self._init_search_worker
+            )
+        
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(*[
+            loop.run_in_executor(self._search_pool, self.find_thread, *query)
+            for query in queries
+        ], return_exceptions=True)
+        
+        submissions = []
+        for query, result in zip(queries, results):
+            if isinstance(result, Exception):
+                logger.error("Error searching r/%s: %s", query[0], result)
+                result = None
+            submissions.append(result)
+        
+        return submissions
+    
     def get_thread_details(self, submission):
         """
         Extract detailed information from a submission.
@@ -126,6 +281,27 @@ class RedditClient:
             'selftext': submission.selftext if submission.is_self else ''
         }
     
+    def get_thread_details_many(self, ids):
+        """
+        Fetch details for many threads in as few requests as possible.
+        
+        Args:
+            ids: List of Reddit thread IDs (without the t3_ prefix)
+        
+        Returns:
+            List of thread detail dictionaries (deleted/unknown threads omitted)
+        """
+        if not ids:
+            return []
+        
+        try:
+            # info() requests up to 100 fullnames per call
+            submissions = self.reddit.info(fullnames=[f't3_{thread_id}' for thread_id in ids])
+            return [self.get_thread_details(submission) for submission in submissions]
+        except Exception as e:
+            logger.error("Error fetching thread details: %s", e)
+            return []
+    
     def post_comment(self, submission, comment_text):
         """
         Post a comment on a submission.
@@ -138,20 +314,40 @@ class RedditClient:
             Comment ID if successful, None otherwise
         """
         try:
-            logger.info(f"Posting comment to r/{submission.subreddit.display_name} thread: {submission.title[:50]}...")
+            logger.info("Posting comment to r/%s thread: %.50s...", submission.subreddit.display_name, submission.title)
             
             comment = submission.reply(comment_text)
             
-            logger.info(f"Successfully posted comment: {comment.id}")
+            logger.info("Successfully posted comment: %s", comment.id)
             return comment.id
             
         except praw.exceptions.APIException as e:
-            logger.error(f"Reddit API error posting comment: {str(e)}")
+            logger.error("Reddit API error posting comment: %s", e)
             return None
         except Exception as e:
-            logger.error(f"Error posting comment: {str(e)}")
+            logger.error("Error posting comment: %s", e)
             return None
     
+    def post_many(self, pairs):
+        """
+        Post several comments in order, spaced out by the comment rate limit.
+        
+        Posts start ~10s apart, far longer than a round-trip, so they're made
+        serially; concurrency would only share the PRAW instance across threads.
+        
+        Args:
+            pairs: List of (submission, comment_text) tuples
+        
+        Returns:
+            List of comment IDs (None for failures), in input order
+        """
+        comment_ids = []
+        for submission, comment_text in pairs:
+            self._comment_limiter.wait()
+            comment_ids.append(self.post_comment(submission, comment_text))
+        
+        return comment_ids
+    
     def test_connection(self):
         """
         Test Reddit API connection.
@@ -161,12 +357,18 @@ class RedditClient:
         """
         try:
             user = self.reddit.user.me()
-            logger.info(f"Reddit connection test successful - logged in as: {user.name}")
+            logger.info("Reddit connection test successful - logged in as: %s", user.name)
             return True
         except Exception as e:
-            logger.error(f"Reddit connection test failed: {str(e)}")
+            logger.error("Reddit connection test failed: %s", e)
             return False
     
+    def close(self):
+        """Shut down the search worker pool"""
+        if self._search_pool is not None:
+            self._search_pool.shutdown(wait=True)
+            self._search_pool = None
+    
     def get_subreddit_rules(self, subreddit_name):
         """
         Get subreddit rules (useful for checking if posting is allowed).
@@ -177,16 +379,61 @@ class RedditClient:
         Returns:
             List of rule dictionaries
         """
+        key = subreddit_name.lower()
+        fetched_at, cached = self._rules_cache.get(key, (0, None))
+        if cached is not None and time.time() - fetched_at < self._rules_ttl:
+            return cached
+        
         try:
             subreddit = self.reddit.subreddit(subreddit_name)
             rules = list(subreddit.rules)
             
-            logger.debug(f"Retrieved {len(rules)} rules for r/{subreddit_name}")
-            return [{'short_name': rule.short_name, 'description': rule.description} for rule in rules]
+            logger.debug("Retrieved %d rules for r/%s", len(rules), subreddit_name)
+            result = [{'short_name': rule.short_name, 'description': rule.description} for rule in rules]
             
         except Exception as e:
-            logger.error(f"Error getting rules for r/{subreddit_name}: {str(e)}")
+            logger.error("Error getting rules for r/%s: %s", subreddit_name, e)
             return []
+        
+        with self._rules_lock:
+            self._rules_cache[key] = (time.time(), result)
+            self._save_rules_cache()
+        
+        return result
+    
+    def _load_rules_cache(self):
+        """
+        Load persisted subreddit rules.
+        
+        Returns:
+            Dictionary of subreddit name -> (fetched_at, rules)
+        """
+        if not self._rules_cache_path:
+            return {}
+        
+        try:
+            with open(self._rules_cache_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return {name: (entry[0], entry[1]) for name, entry in data.items()}
+        except FileNotFoundError:
+            return {}
+        except (ValueError, TypeError, IndexError, AttributeError) as e:
+            logger.warning("Ignoring unreadable rules cache %s: %s", self._rules_cache_path, e)
+            return {}
+    
+    def _save_rules_cache(self):
+        """Write subreddit rules to disk (caller holds _rules_lock)"""
+        if not self._rules_cache_path:
+            return
+        
+        try:
+            os.makedirs(os.path.dirname(self._rules_cache_path) or '.', exist_ok=True)
+            tmp_path = self._rules_cache_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._rules_cache, f)
+            os.replace(tmp_path, self._rules_cache_path)
+        except OSError as e:
+            logger.warning("Could not save rules cache: %s", e)
     
     def is_thread_archived(self, submission):
         """